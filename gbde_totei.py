@@ -8,64 +8,120 @@ example use:
   python gbde_totei.py "https://gutenberg.spiegel.de/buch/die-weber-9199/4" 5 "Hauptmann, Gerhart" "Die Weber" """
 
 import os
+import sys
 import argparse
+import functools
+import concurrent.futures
 import requests
-import lxml
-import bs4
+import lxml.etree
+import lxml.html
+
+# namespaces
+TEI = "{http://www.tei-c.org/ns/1.0}"
+XML = "{http://www.w3.org/XML/1998/namespace}"
+NSM = {None : "http://www.tei-c.org/ns/1.0"}
+
+# qualified tag names, built and interned once instead of concatenated on
+# every SubElement call and tag comparison
+TEI_TEI = sys.intern(TEI + "TEI")
+TEI_TEIHEADER = sys.intern(TEI + "teiHeader")
+TEI_FILEDESC = sys.intern(TEI + "fileDesc")
+TEI_TITLESTMT = sys.intern(TEI + "titleStmt")
+TEI_TITLE = sys.intern(TEI + "title")
+TEI_AUTHOR = sys.intern(TEI + "author")
+TEI_PROFILEDESC = sys.intern(TEI + "profileDesc")
+TEI_LANGUSAGE = sys.intern(TEI + "langUsage")
+TEI_LANGUAGE = sys.intern(TEI + "language")
+TEI_PARTICDESC = sys.intern(TEI + "particDesc")
+TEI_LISTPERSON = sys.intern(TEI + "listPerson")
+TEI_PERSON = sys.intern(TEI + "person")
+TEI_PERSNAME = sys.intern(TEI + "persName")
+TEI_TEXT = sys.intern(TEI + "text")
+TEI_BODY = sys.intern(TEI + "body")
+TEI_DIV = sys.intern(TEI + "div")
+TEI_SP = sys.intern(TEI + "sp")
+TEI_SPEAKER = sys.intern(TEI + "speaker")
+TEI_STAGE = sys.intern(TEI + "stage")
+TEI_P = sys.intern(TEI + "p")
+TEI_LG = sys.intern(TEI + "lg")
+TEI_L = sys.intern(TEI + "l")
+XML_ID = sys.intern(XML + "id")
+
+# html heading tags that may carry act/scene triggers
+_HEADINGS = frozenset("h" + str(n) for n in range(1,7))
+
+# leading punctuation that belongs to the preceding stage element
+_LEAD_PUNCT = (", ", ". ", ": ")
+
+# deletion table that drops line breaks in a single pass
+_NL_DROP = str.maketrans("", "", "\n\r")
+
+@functools.lru_cache(maxsize=256)
+def _speaker_id(speaker_surface):
+    """normalizes a speaker surface form into an id, cached because the same
+    few names recur once per speech turn"""
+
+    return speaker_surface.lower().strip(".").replace(" ", "_")
 
 class GutenbergHtmlToTei:
     """main class to transform html input from gutenberg.spiegel.de into TEI output"""
 
-    # set namespaces
-    TEI = "{http://www.tei-c.org/ns/1.0}"
-    XML = "{http://www.w3.org/XML/1998/namespace}"
-    NSM = {None : "http://www.tei-c.org/ns/1.0"}
-
     def __init__(self, author_name, drama_title, act_trigger, scene_trigger):
         self.author_name = author_name
         self.drama_title = drama_title
         self.act_trigger = act_trigger
         self.scene_trigger = scene_trigger
-        self.tei, self.tei_body = self.initialize_tei()
+        self.tei, self.tei_body, self.listPerson = self.initialize_tei()
+        self._speakers = {}
         self.current_speaker = None
         self.current_act_n = 0
         self.current_act = None
         self.current_scene_n = 0
         self.current_scene = None
         self.last_elem = None
+        # dispatch tables for the parse loops, keyed by html class
+        self._p_class_handlers = {"vers": self.add_lines,
+                                  "stage": self.add_stage}
+        self._span_handlers = {
+            # stage direction
+            "stage": self.add_stage,
+            # speaker name
+            "speaker": self.add_speaker,
+            # stage direction inside speech
+            "regie": lambda elem: self.add_stage(elem, speaker=True)}
 
     def initialize_tei(self):
         """initializes the output TEI with basic structure and metadata"""
 
-        root = lxml.etree.Element(self.TEI+"TEI", nsmap = self.NSM)
-        teiHeader = lxml.etree.SubElement(root, self.TEI+"teiHeader")
-        fileDesc = lxml.etree.SubElement(teiHeader, self.TEI+"fileDesc")
-        titleStmt = lxml.etree.SubElement(fileDesc, self.TEI+"titleStmt")
-        title = lxml.etree.SubElement(titleStmt, self.TEI+"title")
+        root = lxml.etree.Element(TEI_TEI, nsmap = NSM)
+        teiHeader = lxml.etree.SubElement(root, TEI_TEIHEADER)
+        fileDesc = lxml.etree.SubElement(teiHeader, TEI_FILEDESC)
+        titleStmt = lxml.etree.SubElement(fileDesc, TEI_TITLESTMT)
+        title = lxml.etree.SubElement(titleStmt, TEI_TITLE)
         title.text = self.drama_title
-        author = lxml.etree.SubElement(titleStmt, self.TEI+"author")
+        author = lxml.etree.SubElement(titleStmt, TEI_AUTHOR)
         author.text = self.author_name
-        profileDesc = lxml.etree.SubElement(teiHeader, self.TEI+"profileDesc")
-        langUsage = lxml.etree.SubElement(profileDesc, self.TEI+"langUsage")
-        language = lxml.etree.SubElement(langUsage, self.TEI+"language")
+        profileDesc = lxml.etree.SubElement(teiHeader, TEI_PROFILEDESC)
+        langUsage = lxml.etree.SubElement(profileDesc, TEI_LANGUSAGE)
+        language = lxml.etree.SubElement(langUsage, TEI_LANGUAGE)
         language.set("ident", "de")
         language.set("usage", "100")
         language.text = "German"
-        particDesc = lxml.etree.SubElement(profileDesc, self.TEI+"particDesc")
-        listPerson = lxml.etree.SubElement(particDesc, self.TEI+"listPerson")
-        text = lxml.etree.SubElement(root, self.TEI+"text")
-        body = lxml.etree.SubElement(text, self.TEI+"body")
-        return root, body
-
-    def parse_page(self, soup):
-        """parses single html page"""
-
-        div_body = soup.find("div", attrs={"id":"gutenb"})
-        for elem in div_body.children:
-            if elem.name == "p":
-                self.parse_paragraph(elem)
-            elif elem.name in ["h" + str(n) for n in range(1,7)]:
-                heading = elem.getText()
+        particDesc = lxml.etree.SubElement(profileDesc, TEI_PARTICDESC)
+        listPerson = lxml.etree.SubElement(particDesc, TEI_LISTPERSON)
+        text = lxml.etree.SubElement(root, TEI_TEXT)
+        body = lxml.etree.SubElement(text, TEI_BODY)
+        return root, body, listPerson
+
+    def parse_page(self, div_body):
+        """parses the content div of a single html page"""
+
+        parse_paragraph = self.parse_paragraph
+        for elem in div_body.iterchildren():
+            if elem.tag == "p":
+                parse_paragraph(elem)
+            elif elem.tag in _HEADINGS:
+                heading = elem.text_content()
                 if self.act_trigger in heading:
                     self.add_act()
                 elif self.scene_trigger in heading:
@@ -74,35 +130,31 @@ class GutenbergHtmlToTei:
     def parse_paragraph(self, p):
         """internal, parses paragraphs"""
 
-        if p.has_attr("class"):
-            p_type = p.get("class")[0]
-            if p_type == "vers":
-                self.add_lines(p)
-            elif p_type == "stage":
-                self.add_stage(p)
+        p_class = p.get("class")
+        if p_class is not None:
+            handler = self._p_class_handlers.get(p_class.split()[0])
+            if handler is not None:
+                handler(p)
         else:
-            for elem in p.children:
-                if isinstance(elem, bs4.Tag):
-                    if elem.name == "span":
-                        elem_type = elem.get("class")[0]
-                        # stage direction
-                        if elem_type == "stage":
-                            self.add_stage(elem)
-                        # speaker name
-                        elif elem_type == "speaker":
-                            self.add_speaker(elem)
-                        # stage direction inside speech
-                        elif elem_type == "regie":
-                            self.add_stage(elem, speaker=True)
-                # speaker text
-                elif isinstance(elem, bs4.NavigableString):
-                    self.add_speakerText(elem)
+            span_handlers = self._span_handlers
+            add_speakerText = self.add_speakerText
+            # speaker text before the first child element
+            if p.text:
+                add_speakerText(p.text)
+            for elem in p.iterchildren():
+                if elem.tag == "span":
+                    handler = span_handlers.get(elem.get("class").split()[0])
+                    if handler is not None:
+                        handler(elem)
+                # speaker text following a child element
+                if elem.tail:
+                    add_speakerText(elem.tail)
 
     def add_act(self):
         """internal, adds a new act to TEI output"""
 
-        self.current_act = lxml.etree.SubElement(self.tei_body, self.TEI+"div",
-                                                 type="act")
+        self.current_act = lxml.etree.SubElement(self.tei_body, TEI_DIV,
+                                                 attrib={"type": "act"})
         self.current_scene = None
         self.last_elem = self.current_act
 
@@ -113,111 +165,108 @@ class GutenbergHtmlToTei:
         # if there are no acts
         if self.current_act is None:
             self.current_scene = lxml.etree.SubElement(self.tei_body,
-                                                       self.TEI+"div",
-                                                       type="scene")
+                                                       TEI_DIV,
+                                                       attrib={"type": "scene"})
         else:
             self.current_scene = lxml.etree.SubElement(self.current_act,
-                                                       self.TEI+"div",
-                                                       type="scene")
+                                                       TEI_DIV,
+                                                       attrib={"type": "scene"})
         self.last_elem = self.current_scene
 
 
     def add_speaker(self, speaker_elem):
         """internal, adds a new sp-element to TEI output"""
 
-        speaker_surface = speaker_elem.getText()
-        speaker_id =  "#" + speaker_surface.lower().strip(".").replace(" ", "_")
+        speaker_surface = speaker_elem.text_content()
+        speaker_id = _speaker_id(speaker_surface)
         # if there are no scenes
         if self.current_scene is None:
-            self.current_speaker = lxml.etree.SubElement(self.current_act,
-                                                         self.TEI+"sp",
-                                                         who=speaker_id)
+            self.current_speaker = lxml.etree.SubElement(
+                self.current_act, TEI_SP, attrib={"who": "#" + speaker_id})
         else:
-            self.current_speaker = lxml.etree.SubElement(self.current_scene,
-                                                         self.TEI+"sp",
-                                                         who=speaker_id)
+            self.current_speaker = lxml.etree.SubElement(
+                self.current_scene, TEI_SP, attrib={"who": "#" + speaker_id})
         speaker_surface_elem = lxml.etree.SubElement(self.current_speaker,
-                                                     self.TEI+"speaker")
-        speaker_surface_elem.text = speaker_surface.strip(".")
+                                                     TEI_SPEAKER)
+        speaker_surface_stripped = speaker_surface.strip(".")
+        speaker_surface_elem.text = speaker_surface_stripped
+        self._speakers[speaker_surface_stripped] = speaker_id
         self.last_elem = speaker_surface_elem
 
     def add_speakerText(self, speaker_text):
         """adds speaker text that is structured in paragraphs to TEI output"""
 
+        stripped = speaker_text.strip()
+        # most text nodes are pure inter-tag whitespace, skip them outright
+        if not stripped:
+            return
         # because of html-inconsistencies, leading punctuation needs to be added
         # to the last stage element if present
-        if (speaker_text.startswith(", ") or speaker_text.startswith(". ")
-            or speaker_text.startswith(": ")):
-            if self.last_elem.tag == self.TEI+"stage":
+        if speaker_text.startswith(_LEAD_PUNCT):
+            if self.last_elem.tag == TEI_STAGE:
                 self.last_elem.text += speaker_text[0]
-            speaker_text = speaker_text[2:]
-        speaker_text = speaker_text.replace("\n", "")
+            stripped = speaker_text[2:].strip()
         if self.current_speaker is not None:
-            if len(speaker_text.strip()) > 1:
+            speaker_text = stripped.translate(_NL_DROP)
+            if len(speaker_text) > 1:
                 p_elem = lxml.etree.SubElement(self.current_speaker,
-                                               self.TEI+"p")
-                p_elem.text = speaker_text.strip()
+                                               TEI_P)
+                p_elem.text = speaker_text
                 self.last_elem = p_elem
             # because of html-inconsistencies, single characters need to be
             # added to the last stage element if present
-            elif (len(speaker_text.strip()) == 1
-                  and self.last_elem.tag == self.TEI+"stage"):
-                self.last_elem.text += speaker_text.strip()
+            elif (len(speaker_text) == 1
+                  and self.last_elem.tag == TEI_STAGE):
+                self.last_elem.text += speaker_text
 
     def add_stage(self, stage, speaker=False):
         """internal, adds a stage direction to TEI output"""
 
         if speaker:
             stage_elem = lxml.etree.SubElement(self.current_speaker,
-                                               self.TEI+"stage")
+                                               TEI_STAGE)
         else:
             if self.current_scene is None:
                 stage_elem = lxml.etree.SubElement(self.current_act,
-                                                   self.TEI+"stage")
+                                                   TEI_STAGE)
             else:
                 stage_elem = lxml.etree.SubElement(self.current_scene,
-                                                   self.TEI+"stage")
-        stage_elem.text = stage.getText().replace("\n", "")
+                                                   TEI_STAGE)
+        stage_elem.text = stage.text_content().translate(_NL_DROP)
         self.last_elem = stage_elem
 
     def add_lines(self, p_elem):
         """internal, adds speaker text that is structured in verses"""
 
         lg_element = lxml.etree.SubElement(self.current_speaker,
-                                           self.TEI+"lg")
-        lines = [elem for elem in p_elem.children
-                 if not isinstance(elem, bs4.Tag)]
-        for line in lines:
-            if line.startswith(", ") or line.startswith(". "):
+                                           TEI_LG)
+        for line in p_elem.xpath("./text()"):
+            if line.startswith(_LEAD_PUNCT):
                 line = line[2:]
-            l_element = lxml.etree.SubElement(lg_element, self.TEI+"l")
-            l_element.text = line.replace("\n", "").strip()
+            l_element = lxml.etree.SubElement(lg_element, TEI_L)
+            l_element.text = line.translate(_NL_DROP).strip()
         self.last_elem = lg_element
 
     def add_listPerson(self):
         """fills and adds the listPerson-element to TEI output"""
 
-        listPerson = self.tei.find(".//" + self.TEI+"listPerson")
-        speaker_set = sorted(set([tag.text for tag in self.tei_body.iter()
-                                  if tag.tag == self.TEI+"speaker"]))
-        for speaker in speaker_set:
-            person = lxml.etree.SubElement(listPerson, self.TEI+"person")
-            person.set(self.XML+"id",
-                       speaker.lower().replace(" ", "_").strip("."))
-            persName = lxml.etree.SubElement(person, self.TEI+"persName")
+        for speaker, speaker_id in sorted(self._speakers.items()):
+            person = lxml.etree.SubElement(self.listPerson, TEI_PERSON)
+            person.set(XML_ID, speaker_id)
+            persName = lxml.etree.SubElement(person, TEI_PERSNAME)
             persName.text = speaker
 
     def write_to_file(self, dir):
-        """writes output lxml-object to .xml-file"""
+        """writes output lxml-object incrementally to .xml-file"""
 
-        output_string = lxml.etree.tostring(self.tei,
-                                       pretty_print=True,
-                                       xml_declaration=True,
-                                       encoding='UTF-8')
         filename = (self.author_name.split(", ")[0].lower() + "_"
                     + self.drama_title.replace(" ", "_").lower() + ".xml")
-        with open(os.path.join(dir, filename), "wb") as fh:
-            fh.write(output_string)
+        # stream the serialization into the file instead of materializing
+        # the whole document as one bytes object next to the tree
+        with lxml.etree.xmlfile(os.path.join(dir, filename),
+                                encoding="UTF-8") as xf:
+            xf.write_declaration()
+            xf.write(self.tei, pretty_print=True)
 
 ################################################################################
 ################################################################################
@@ -245,12 +294,26 @@ if __name__ == "__main__":
     # initialize object and parse pages
     tei_output = GutenbergHtmlToTei(args.author, args.drama, args.act_trigger,
                                     args.scene_trigger)
-    start_n = int(args.start_url[-1])
-    for i in range(args.n_pages):
-        current_url = args.start_url[:-1] + str(start_n + i)
-        r = requests.get(current_url)
-        soup = bs4.BeautifulSoup(r.text, features="lxml")
-        tei_output.parse_page(soup)
+    # split off the whole trailing page number, not just the last character,
+    # so dramas with ten or more pages resolve correctly
+    url_prefix, _, start_str = args.start_url.rpartition("/")
+    start_n = int(start_str)
+    urls = [f"{url_prefix}/{start_n + i}" for i in range(args.n_pages)]
+    # fetch all pages in parallel over a pooled session, but parse them in
+    # original order because the converter tracks act/scene state
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=16,
+                                            pool_maxsize=16,
+                                            max_retries=3)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    fetch = functools.partial(session.get, timeout=(5, 30))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(fetch, urls))
+    for r in responses:
+        r.raise_for_status()
+        doc = lxml.html.fromstring(r.content)
+        tei_output.parse_page(doc.get_element_by_id("gutenb"))
 
     # finalize output and write to file
     tei_output.add_listPerson()